@@ -50,6 +50,7 @@ class _Config(object):
                 """PyTorch configuration
                 """
                 self._device = None
+                self._compile = False
                 # torch.distributed config
                 self._local_rank = int(os.getenv("LOCAL_RANK", "0"))
                 self._rank = int(os.getenv("RANK", "0"))
@@ -82,6 +83,19 @@ class _Config(object):
             def device(self, device: Union[str, "torch.device"]) -> None:
                 self._device = device
 
+            @property
+            def compile(self) -> bool:
+                """Whether to compile the models' stochastic computation using ``torch.compile`` (PyTorch 2.0+)
+
+                This setting is read by the Gaussian models at instantiation.
+                The model-defined compute method is not compiled
+                """
+                return self._compile
+
+            @compile.setter
+            def compile(self, value: bool) -> None:
+                self._compile = bool(value)
+
             @property
             def local_rank(self) -> int:
                 """The rank of the worker/process (e.g.: GPU) within a local worker group (e.g.: node)
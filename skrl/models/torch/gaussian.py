@@ -1,4 +1,6 @@
-from typing import Any, Mapping, Tuple, Union
+from typing import Any, Mapping, Optional, Tuple, Union
+
+import warnings
 
 import gym
 import gymnasium
@@ -6,6 +8,85 @@ import gymnasium
 import torch
 from torch.distributions import Normal
 
+from skrl import config, logger
+
+
+def _jit_script(fn):
+    # silence the TorchScript deprecation warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=FutureWarning)
+        return torch.jit.script(fn)
+
+
+@_jit_script
+def _clamp_exp(log_std: torch.Tensor, lo: float, hi: float) -> Tuple[torch.Tensor, torch.Tensor]:
+    # clamp the log standard deviations and compute the standard deviations in a single fused pointwise kernel
+    log_std = torch.clamp(log_std, lo, hi)
+    return log_std, torch.exp(log_std)
+
+
+@_jit_script
+def _reduce_log_prob(log_prob: torch.Tensor, reduction_id: int) -> torch.Tensor:
+    # reduce the log of the probability density function (0: mean, 1: sum, 2: prod, 3: none)
+    # keeping the actions' number of dimensions
+    if reduction_id == 0:
+        return log_prob.mean(dim=-1, keepdim=True)
+    elif reduction_id == 1:
+        return log_prob.sum(dim=-1, keepdim=True)
+    elif reduction_id == 2:
+        return log_prob.prod(dim=-1, keepdim=True)
+    return log_prob
+
+
+@_jit_script
+def _normal_log_prob(x: torch.Tensor, mean: torch.Tensor, log_std: torch.Tensor) -> torch.Tensor:
+    # log of the probability density function of the normal distribution
+    z = (x - mean) * torch.exp(-log_std)
+    return -0.5 * z * z - (log_std + 0.9189385332046727)  # 0.5 * log(2 * pi)
+
+
+@_jit_script
+def _gaussian_act_core(mean: torch.Tensor,
+                       log_std: torch.Tensor,
+                       noise: torch.Tensor,
+                       taken_actions: Optional[torch.Tensor],
+                       clip_log_std: bool,
+                       log_std_min: float,
+                       log_std_max: float,
+                       clip_actions_min: Optional[torch.Tensor],
+                       clip_actions_max: Optional[torch.Tensor],
+                       reduction_id: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    # sample (reparameterization trick) and compute the log of the probability density function
+    if clip_log_std:
+        log_std, std = _clamp_exp(log_std, log_std_min, log_std_max)
+    else:
+        std = torch.exp(log_std)
+    actions = mean + std * noise
+    if clip_actions_min is not None and clip_actions_max is not None:
+        actions = torch.clamp(actions, clip_actions_min, clip_actions_max)
+        # the log probability density function is computed for the clipped actions
+        if taken_actions is None:
+            taken_actions = actions
+    if taken_actions is not None:
+        log_prob = _normal_log_prob(taken_actions, mean, log_std)
+    else:
+        # (x - mean) / std is the sampled noise itself for unclipped actions
+        log_prob = -0.5 * noise * noise - (log_std + 0.9189385332046727)  # 0.5 * log(2 * pi)
+    return actions, _reduce_log_prob(log_prob, reduction_id), log_std, std
+
+
+# compiled GaussianMixin._forward_stochastic indexed by torch.compile options (mode, dynamic)
+_compiled_forward_stochastic_cache = {}
+
+
+def _compiled_forward_stochastic(mode: str, dynamic: Optional[bool]):
+    key = (mode, dynamic)
+    if key not in _compiled_forward_stochastic_cache:
+        _compiled_forward_stochastic_cache[key] = torch.compile(GaussianMixin._forward_stochastic,
+                                                                mode=mode,
+                                                                dynamic=dynamic)
+    return _compiled_forward_stochastic_cache[key]
+
 
 class GaussianMixin:
     def __init__(self,
@@ -14,7 +95,8 @@ class GaussianMixin:
                  min_log_std: float = -20,
                  max_log_std: float = 2,
                  reduction: str = "sum",
-                 role: str = "") -> None:
+                 role: str = "",
+                 mixed_precision: bool = False) -> None:
         """Gaussian mixin model (stochastic model)
 
         :param clip_actions: Flag to indicate whether the actions should be clipped to the action space (default: ``False``)
@@ -31,6 +113,13 @@ class GaussianMixin:
         :type reduction: str, optional
         :param role: Role play by the model (default: ``""``)
         :type role: str, optional
+        :param mixed_precision: Flag to indicate whether the model-defined compute method should run under bfloat16
+                                autocast (default: ``False``). It only takes effect on CUDA devices with compute
+                                capability 8.0+ (Ampere or newer) and PyTorch 1.10+. The computed mean actions and
+                                log standard deviations are upcast to single precision (float32), so the sampling,
+                                the log of the probability density function and the distribution are computed
+                                and returned in single precision
+        :type mixed_precision: bool, optional
 
         :raises ValueError: If the reduction method is not valid
 
@@ -79,18 +168,40 @@ class GaussianMixin:
             self._clip_actions_min = torch.tensor(self.action_space.low, device=self.device, dtype=torch.float32)
             self._clip_actions_max = torch.tensor(self.action_space.high, device=self.device, dtype=torch.float32)
 
+        # log standard deviation bounds as Python floats (scalar kernel arguments)
         self._clip_log_std = clip_log_std
-        self._log_std_min = min_log_std
-        self._log_std_max = max_log_std
+        self._log_std_min = float(min_log_std)
+        self._log_std_max = float(max_log_std)
 
-        self._log_std = None
-        self._num_samples = None
+        # mean actions, log standard deviations and standard deviations computed in the last call to act
+        self._act_state = None
+        # lazily instantiated distribution (and the act state it was instantiated from)
         self._distribution = None
 
+        self._noise = None
+
+        # mixed precision (bfloat16 autocast)
+        self._autocast_dtype = None
+        if mixed_precision:
+            if hasattr(torch, "autocast") and self.device.type == "cuda" \
+                    and torch.cuda.get_device_capability(self.device) >= (8, 0):
+                self._autocast_dtype = torch.bfloat16
+            else:
+                logger.warning("Mixed precision requires PyTorch 1.10+ and a CUDA device with compute capability 8.0+. "
+                               "Disabling it")
+
         if reduction not in ["mean", "sum", "prod", "none"]:
             raise ValueError("reduction must be one of 'mean', 'sum', 'prod' or 'none'")
-        self._reduction = torch.mean if reduction == "mean" else torch.sum if reduction == "sum" \
-            else torch.prod if reduction == "prod" else None
+        # reduction method identifier (0: mean, 1: sum, 2: prod, 3: none)
+        self._reduction_id = ["mean", "sum", "prod", "none"].index(reduction)
+
+        # torch.compile options (mode, dynamic)
+        self._compile_options = None
+        if config.torch.compile:
+            if hasattr(torch, "compile"):
+                self._compile_options = ("reduce-overhead", None)
+            else:
+                logger.warning("torch.compile is not available in the installed PyTorch version (requires 2.0+)")
 
     def act(self,
             inputs: Mapping[str, Union[torch.Tensor, Any]],
@@ -111,6 +222,17 @@ class GaussianMixin:
                  and extra output values
         :rtype: tuple of torch.Tensor, torch.Tensor or None, and dict
 
+        .. note::
+
+            If the model is in evaluation mode (see :py:meth:`set_mode`) and autograd is disabled (e.g.: ``torch.no_grad()``),
+            the actions and the log of the probability density function are computed under ``torch.inference_mode()``.
+            The returned tensors are then inference tensors: they cannot be updated in-place outside inference mode
+
+        .. note::
+
+            No device management is performed by this method: the inputs (e.g.: ``"states"``, ``"taken_actions"``)
+            are expected to be already allocated on the model's device (as the agents and environment wrappers do)
+
         Example::
 
             >>> # given a batch of sample states with shape (4096, 60)
@@ -119,34 +241,140 @@ class GaussianMixin:
             torch.Size([4096, 8]) torch.Size([4096, 1]) torch.Size([4096, 8])
         """
         # map from states/observations to mean actions and log standard deviations
-        mean_actions, log_std, outputs = self.compute(inputs, role)
+        if self._autocast_dtype is None:
+            mean_actions, log_std, outputs = self.compute(inputs, role)
+        else:
+            with torch.autocast(device_type="cuda", dtype=self._autocast_dtype):
+                mean_actions, log_std, outputs = self.compute(inputs, role)
+            # run the stochastic computation (and keep the act state) in single precision
+            mean_actions, log_std = mean_actions.float(), log_std.float()
+        # contiguous mean actions for the fused pointwise operations
+        mean_actions = mean_actions.contiguous()
+
+        # standard normal noise for the reparameterization trick
+        noise = self._standard_normal(mean_actions)
+
+        # stochastic computation (in inference mode when evaluating without autograd)
+        if self.training or torch.is_grad_enabled():
+            actions, log_prob, log_std, std = self._forward_stochastic_impl(mean_actions,
+                                                                            log_std,
+                                                                            noise,
+                                                                            inputs.get("taken_actions", None))
+        else:
+            # detach parameters, which cannot be recorded for backward in inference mode
+            with torch.inference_mode():
+                actions, log_prob, log_std, std = self._forward_stochastic_impl(mean_actions.detach(),
+                                                                                log_std.detach(),
+                                                                                noise,
+                                                                                inputs.get("taken_actions", None))
+
+        # act state (mean actions, log standard deviations and standard deviations)
+        self._act_state = (mean_actions, log_std, std)
 
-        # clamp log standard deviations
-        if self._clip_log_std:
-            log_std = torch.clamp(log_std, self._log_std_min, self._log_std_max)
+        outputs["mean_actions"] = mean_actions
+        return actions, log_prob, outputs
 
-        self._log_std = log_std
-        self._num_samples = mean_actions.shape[0]
+    def compile_for_shape(self, batch_size: int) -> None:
+        """Compile the stochastic computation of the model for a fixed batch size (PyTorch 2.0+)
 
-        # distribution
-        self._distribution = Normal(mean_actions, log_std.exp())
+        The sampling and the computation of the log of the probability density function are compiled using
+        ``torch.compile`` with static shapes (``dynamic=False``) and ``mode="reduce-overhead"`` (CUDA graphs)
+        to reduce the CPU-side overhead when acting with a fixed number of environments.
+        A different batch size will trigger a recompilation. Note that the model-defined compute method is not compiled.
 
-        # sample using the reparameterization trick
-        actions = self._distribution.rsample()
+        The warm-up (compilation) is performed on the model's device with dummy mean actions of shape
+        ``(batch_size, num_actions)`` and log standard deviations of shape ``(num_actions,)``, without calling
+        the model-defined compute method nor modifying the model's last act state
 
-        # clip actions
-        if self._clip_actions:
-            actions = torch.clamp(actions, min=self._clip_actions_min, max=self._clip_actions_max)
+        :param batch_size: Batch size (e.g.: number of environments) to compile for
+        :type batch_size: int
 
-        # log of the probability density function
-        log_prob = self._distribution.log_prob(inputs.get("taken_actions", actions))
-        if self._reduction is not None:
-            log_prob = self._reduction(log_prob, dim=-1)
-        if log_prob.dim() != actions.dim():
-            log_prob = log_prob.unsqueeze(-1)
+        :raises RuntimeError: If the installed PyTorch version doesn't support ``torch.compile``
 
-        outputs["mean_actions"] = mean_actions
-        return actions, log_prob, outputs
+        Example::
+
+            >>> # given a vectorized environment with 4096 sub-environments
+            >>> model.compile_for_shape(4096)
+        """
+        if not hasattr(torch, "compile"):
+            raise RuntimeError("torch.compile is not available in the installed PyTorch version (requires 2.0+)")
+        self._compile_options = ("reduce-overhead", False)
+        # warm up (trigger the compilation) for the given shape
+        mean_actions = torch.zeros((batch_size, self.num_actions), device=self.device, dtype=torch.float32)
+        log_std = torch.zeros((self.num_actions,), device=self.device, dtype=torch.float32)
+        noise = torch.zeros_like(mean_actions)
+        with torch.no_grad(), torch.inference_mode(not self.training):
+            self._forward_stochastic_impl(mean_actions, log_std, noise)
+
+    def _standard_normal(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Draw standard normal noise with the same shape, data type and device as the given tensor
+
+        When autograd is disabled (e.g.: during rollouts) a preallocated buffer is filled in-place and reused,
+        making the sampling allocation-free (a prerequisite to capture it in CUDA graphs).
+        Otherwise, a new tensor is allocated since the noise is saved by autograd for the backward pass
+
+        :param tensor: Tensor whose shape, data type and device the noise must match
+        :type tensor: torch.Tensor
+
+        :return: Standard normal noise
+        :rtype: torch.Tensor
+        """
+        if torch.is_grad_enabled():
+            return torch.randn_like(tensor)
+        # inference tensors cannot be updated in-place outside inference mode
+        if self._noise is None or self._noise.shape != tensor.shape \
+                or self._noise.dtype != tensor.dtype or self._noise.device != tensor.device \
+                or self._noise.is_inference() != torch.is_inference_mode_enabled():
+            self._noise = torch.empty_like(tensor)
+        return self._noise.normal_()
+
+    def _forward_stochastic_impl(self,
+                                 mean_actions: torch.Tensor,
+                                 log_std: torch.Tensor,
+                                 noise: torch.Tensor,
+                                 taken_actions: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor,
+                                                                                        torch.Tensor, torch.Tensor]:
+        """Run the stochastic computation, compiled or not depending on the model's compile options
+        """
+        if self._compile_options is None:
+            return self._forward_stochastic(mean_actions, log_std, noise, taken_actions)
+        return _compiled_forward_stochastic(*self._compile_options)(self, mean_actions, log_std, noise, taken_actions)
+
+    def _forward_stochastic(self,
+                            mean_actions: torch.Tensor,
+                            log_std: torch.Tensor,
+                            noise: torch.Tensor,
+                            taken_actions: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor,
+                                                                                   torch.Tensor, torch.Tensor]:
+        """Sample actions and compute the log of the probability density function
+
+        This method only operates on tensors and has no side effects (it doesn't modify the model's attributes)
+        so that it can be compiled
+
+        :param mean_actions: Mean actions
+        :type mean_actions: torch.Tensor
+        :param log_std: Log standard deviations
+        :type log_std: torch.Tensor
+        :param noise: Standard normal noise used to sample the actions (reparameterization trick)
+        :type noise: torch.Tensor
+        :param taken_actions: Actions taken by the policy to compute the log probability density function for.
+                              If None, the sampled actions will be used (default: ``None``)
+        :type taken_actions: torch.Tensor, optional
+
+        :return: Sampled actions, log of the probability density function, (clamped) log standard deviations
+                 and standard deviations
+        :rtype: tuple of torch.Tensor
+        """
+        return _gaussian_act_core(mean_actions,
+                                  log_std,
+                                  noise,
+                                  taken_actions,
+                                  self._clip_log_std,
+                                  self._log_std_min,
+                                  self._log_std_max,
+                                  self._clip_actions_min if self._clip_actions else None,
+                                  self._clip_actions_max if self._clip_actions else None,
+                                  self._reduction_id)
 
     def get_entropy(self, role: str = "") -> torch.Tensor:
         """Compute and return the entropy of the model
@@ -162,13 +390,20 @@ class GaussianMixin:
             >>> print(entropy.shape)
             torch.Size([4096, 8])
         """
-        if self._distribution is None:
+        if self._act_state is None:
             return torch.tensor(0.0, device=self.device)
-        return self._distribution.entropy().to(self.device)
+        mean_actions, log_std, _ = self._act_state
+        # closed-form entropy of the normal distribution: 0.5 + 0.5 * log(2 * pi) + log(std)
+        return (log_std + 1.4189385332046727).expand_as(mean_actions)
 
     def get_log_std(self, role: str = "") -> torch.Tensor:
         """Return the log standard deviation of the model
 
+        .. note::
+
+            The returned tensor is an expanded view (no memory is allocated/copied) of the log standard deviation.
+            Call ``.contiguous()`` on it if a contiguous tensor is required
+
         :return: Log standard deviation of the model
         :rtype: torch.Tensor
         :param role: Role play by the model (default: ``""``)
@@ -180,7 +415,8 @@ class GaussianMixin:
             >>> print(log_std.shape)
             torch.Size([4096, 8])
         """
-        return self._log_std.repeat(self._num_samples, 1)
+        mean_actions, log_std, _ = self._act_state
+        return log_std.expand(mean_actions.shape[0], log_std.shape[-1])
 
     def distribution(self, role: str = "") -> torch.distributions.Normal:
         """Get the current distribution of the model
@@ -196,4 +432,10 @@ class GaussianMixin:
             >>> print(distribution)
             Normal(loc: torch.Size([4096, 8]), scale: torch.Size([4096, 8]))
         """
-        return self._distribution
+        if self._act_state is None:
+            return None
+        # instantiate the distribution on demand (without argument validation)
+        if self._distribution is None or self._distribution[0] is not self._act_state:
+            mean_actions, _, std = self._act_state
+            self._distribution = (self._act_state, Normal(mean_actions, std, validate_args=False))
+        return self._distribution[1]
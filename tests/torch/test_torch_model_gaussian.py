@@ -0,0 +1,202 @@
+import pytest
+
+import copy
+import itertools
+import pickle
+import gymnasium as gym
+
+import torch
+import torch.nn as nn
+from torch.distributions import Normal
+
+from skrl.models.torch import GaussianMixin, Model
+
+
+class Policy(GaussianMixin, Model):
+    def __init__(self, num_observations, num_actions, device, **kwargs):
+        Model.__init__(self, num_observations, num_actions, device)
+        GaussianMixin.__init__(self, **kwargs)
+
+        self.net = nn.Linear(self.num_observations, self.num_actions)
+        self.log_std_parameter = nn.Parameter(torch.full((self.num_actions,), -0.5))
+
+    def compute(self, inputs, role=""):
+        return self.net(inputs["states"]), self.log_std_parameter, {}
+
+
+class ExpandedLogStdPolicy(Policy):
+    def compute(self, inputs, role=""):
+        # log standard deviations with the batch dimension
+        log_std = self.log_std_parameter.unsqueeze(0).expand(inputs["states"].shape[0], -1) * 1.0
+        return self.net(inputs["states"]), log_std, {}
+
+
+def _grads(model):
+    return [torch.zeros_like(p) if p.grad is None else p.grad.clone() for p in model.parameters()]
+
+
+@pytest.mark.parametrize("clip_actions,clip_log_std,reduction,policy_class,taken",
+                         list(itertools.product([False, True],
+                                                [False, True],
+                                                ["mean", "sum", "prod", "none"],
+                                                [Policy, ExpandedLogStdPolicy],
+                                                [False, True])))
+def test_equivalence(capsys, clip_actions, clip_log_std, reduction, policy_class, taken):
+    torch.manual_seed(0)
+    model = policy_class(gym.spaces.Box(-1, 1, (5,)), gym.spaces.Box(-0.5, 0.5, (3,)), "cpu",
+                         clip_actions=clip_actions,
+                         clip_log_std=clip_log_std,
+                         min_log_std=-1.0,
+                         max_log_std=0.5,
+                         reduction=reduction)
+    with torch.no_grad():
+        model.log_std_parameter.copy_(torch.linspace(-3, 3, 3))
+
+    inputs = {"states": torch.randn((7, 5))}
+    if taken:
+        inputs["taken_actions"] = 0.3 * torch.randn((7, 3))
+    actions, log_prob, outputs = model.act(inputs)
+    mean_actions = outputs["mean_actions"]
+
+    # reference values (torch.distributions)
+    log_std = model.log_std_parameter.clamp(-1.0, 0.5) if clip_log_std else model.log_std_parameter
+    log_std = log_std.expand(7, 3)
+    distribution = Normal(mean_actions, log_std.exp())
+    reference = distribution.log_prob(inputs["taken_actions"] if taken else actions)
+    if reduction != "none":
+        reference = getattr(torch, reduction)(reference, dim=-1, keepdim=True)
+
+    # act
+    assert actions.shape == (7, 3)
+    assert log_prob.shape == reference.shape
+    assert torch.allclose(log_prob, reference, atol=1e-5)
+    if clip_actions:
+        assert actions.abs().max() <= 0.5
+
+    # gradients
+    log_prob.sum().backward(retain_graph=True)
+    grads = _grads(model)
+    model.zero_grad()
+    reference.sum().backward()
+    for grad, reference_grad in zip(grads, _grads(model)):
+        assert torch.allclose(grad, reference_grad, atol=1e-4)
+
+    # entropy, log standard deviations and distribution
+    assert torch.allclose(model.get_entropy(), distribution.entropy(), atol=1e-5)
+    assert model.get_log_std().shape == (7, 3)
+    assert torch.allclose(model.get_log_std(), log_std)
+    assert torch.allclose(model.distribution().mean, mean_actions)
+    assert torch.allclose(model.distribution().stddev, log_std.exp())
+
+
+def test_act_state(capsys):
+    model = Policy(5, 3, "cpu")
+    assert model.distribution() is None
+    assert model.get_entropy().item() == 0
+
+    # evaluation mode without autograd: inference tensors
+    model.set_mode("eval")
+    with torch.no_grad():
+        actions, log_prob, _ = model.act({"states": torch.randn((7, 5))})
+    assert actions.is_inference() and log_prob.is_inference()
+    assert model.get_entropy().shape == (7, 3)
+
+    # training mode: differentiable tensors
+    model.set_mode("train")
+    actions, log_prob, _ = model.act({"states": torch.randn((7, 5))})
+    assert not actions.is_inference() and log_prob.requires_grad
+
+    # the distribution is cached until the next act
+    distribution = model.distribution()
+    assert model.distribution() is distribution
+    model.act({"states": torch.randn((4, 5))})
+    assert model.distribution() is not distribution
+    assert model.distribution().mean.shape == (4, 3)
+    assert model.get_log_std().shape == (4, 3)
+    assert model.get_entropy().shape == (4, 3)
+
+
+def test_noise_buffer(capsys):
+    model = Policy(5, 3, "cpu")
+    states = torch.randn((7, 5))
+
+    # the buffer is not used when autograd is enabled
+    model.act({"states": states})
+    assert model._noise is None
+
+    # the buffer is reused for the same shape and reallocated for a different one
+    with torch.no_grad():
+        model.act({"states": states})
+        noise = model._noise
+        model.act({"states": states})
+        assert model._noise is noise
+        model.act({"states": torch.randn((4, 5))})
+        assert model._noise is not noise and model._noise.shape == (4, 3)
+
+
+@pytest.mark.parametrize("device", ["cpu", "cuda:0"])
+def test_noise_buffer_inference_mode(capsys, device):
+    model = Policy(4, 2, device).to(device)
+    model.set_mode("eval")
+    states = torch.randn((10, 4), device=device)
+
+    # the noise buffer is created in inference mode and then reused outside it
+    with torch.inference_mode():
+        model.act({"states": states})
+    with torch.no_grad():
+        actions, _, _ = model.act({"states": states})
+    assert actions.shape == (10, 2)
+    with torch.inference_mode():
+        actions, _, _ = model.act({"states": states})
+    assert actions.shape == (10, 2)
+
+
+@pytest.mark.parametrize("device", ["cpu", "cuda:0"])
+def test_compile_for_shape(capsys, device):
+    if not hasattr(torch, "compile"):
+        pytest.skip("torch.compile is not available")
+    model = Policy(4, 2, device, clip_actions=True).to(device)
+    with torch.no_grad():
+        model.act({"states": torch.randn((7, 4), device=device)})
+    model.compile_for_shape(8)
+    assert model._compile_options == ("reduce-overhead", False)
+    # the last act state is kept
+    assert model.distribution().loc.shape == (7, 2)
+
+    states = torch.randn((8, 4), device=device)
+    with torch.no_grad():
+        actions, log_prob, outputs = model.act({"states": states})
+    distribution = torch.distributions.Normal(outputs["mean_actions"], model.log_std_parameter.exp())
+    assert torch.allclose(log_prob, distribution.log_prob(actions).sum(dim=-1, keepdim=True), atol=1e-5)
+
+    # the compiled model is copyable and picklable (e.g.: for spawned processes)
+    for other in [copy.deepcopy(model), pickle.loads(pickle.dumps(model))]:
+        assert other._compile_options == model._compile_options
+        with torch.no_grad():
+            other.net.bias.fill_(10)
+            _, _, outputs = other.act({"states": states})
+        assert not torch.allclose(outputs["mean_actions"], model.act({"states": states})[2]["mean_actions"])
+
+
+def test_mixed_precision_unsupported(capsys):
+    model = Policy(4, 2, "cpu", mixed_precision=True)
+    assert model._autocast_dtype is None
+
+    actions, log_prob, outputs = model.act({"states": torch.randn((10, 4))})
+    assert actions.dtype == torch.float32
+    assert outputs["mean_actions"].dtype == torch.float32
+
+
+@pytest.mark.skipif(not torch.cuda.is_available() or torch.cuda.get_device_capability() < (8, 0),
+                    reason="bfloat16 autocast requires a CUDA device with compute capability 8.0+")
+def test_mixed_precision(capsys):
+    model = Policy(4, 2, "cuda:0", mixed_precision=True).to("cuda:0")
+    assert model._autocast_dtype == torch.bfloat16
+
+    # the compute method runs under autocast while the stochastic computation runs in single precision
+    actions, log_prob, outputs = model.act({"states": torch.randn((10, 4), device="cuda:0")})
+    assert actions.dtype == torch.float32
+    assert log_prob.dtype == torch.float32
+    assert outputs["mean_actions"].dtype == torch.float32
+    assert model.get_log_std().dtype == torch.float32
+    assert model.distribution().loc.dtype == torch.float32